@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+#
+# Copyright 2016 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Content-addressed cache for the outputs of build actions.
+
+Used by cached_action.py for actions that are pure functions of their inputs and
+arguments, so that fresh build directories and other checkouts can reuse
+outputs instead of regenerating them. Entries are keyed by a hash of the
+script name, arguments, and input contents, and restored by hardlink when
+possible.
+
+$GN_TOOLS_CACHE_DIR sets the location (default: $XDG_CACHE_HOME/gn-tools or
+~/.cache/gn-tools); set it to the empty string to disable the cache.
+$GN_TOOLS_CACHE_SIZE sets the size limit in bytes, optionally with a K, M,
+or G suffix (default: 1G, also used if the value is malformed). The least
+recently used entries are evicted first, at most once every EVICT_INTERVAL
+seconds.
+
+Callers should treat an OSError from any of these functions as a cache
+miss, and run the action as usual.
+"""
+
+import hashlib
+import os
+import shutil
+import time
+
+VERSION = b"gn-tools action cache 1\0"
+DEFAULT_SIZE = 1 << 30
+SIZE_SUFFIXES = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+EVICT_INTERVAL = 60
+
+
+def cache_dir():
+    """Returns the cache location, or None if the cache is disabled."""
+    path = os.environ.get("GN_TOOLS_CACHE_DIR")
+    if path is not None:
+        return path or None
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "gn-tools")
+
+
+def max_size():
+    size = os.environ.get("GN_TOOLS_CACHE_SIZE", "").strip().upper()
+    try:
+        if size[-1:] in SIZE_SUFFIXES:
+            return int(size[:-1]) * SIZE_SUFFIXES[size[-1]]
+        return int(size)
+    except ValueError:
+        return DEFAULT_SIZE
+
+
+def key(script, inputs, args):
+    """Returns the cache key for running script with args over inputs.
+
+    Paths in args are relative to the build directory, and so are the same
+    in every out/<os>/<mode>.
+    """
+    h = hashlib.sha256(VERSION)
+    for arg in [os.path.basename(script)] + args:
+        h.update(arg.encode("utf-8") + b"\0")
+    h.update(b"\0")
+    for path in inputs:
+        with open(path, "rb") as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()
+
+
+def _entry(root, key):
+    return os.path.join(root, key[:2], key)
+
+
+def restore(root, key, outputs):
+    """Restores outputs from the cache; returns False on a miss.
+
+    Outputs that already have the cached content are left untouched, so
+    ninja can restat them. Missing outputs, as in a fresh build directory,
+    are hardlinked to the entry (or copied, across filesystems); they keep
+    the entry’s mtime, since touching them would touch every other build
+    directory that shares the inode. Outputs with other content are
+    replaced by a fresh copy instead, so their mtime moves past anything
+    already built from the old content. The entry directory is touched to
+    mark it as recently used.
+    """
+    entry = _entry(root, key)
+    cached = [os.path.join(entry, str(i)) for i in range(len(outputs))]
+    if not all(os.path.isfile(path) for path in cached):
+        return False
+    for src, dst in zip(cached, outputs):
+        if _same_content(src, dst):
+            continue
+        tmp = dst + ".cache-tmp"
+        _remove(tmp)
+        if os.path.lexists(dst):
+            shutil.copyfile(src, tmp)
+        else:
+            try:
+                os.link(src, tmp)
+            except OSError:
+                shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    os.utime(entry)
+    return True
+
+
+def unshare(outputs):
+    """Replaces outputs hardlinked from the cache with private copies.
+
+    Scripts rewrite their outputs in place, which must not reach the cache.
+    """
+    for path in outputs:
+        try:
+            if os.stat(path).st_nlink < 2:
+                continue
+        except FileNotFoundError:
+            continue
+        tmp = path + ".cache-tmp"
+        try:
+            shutil.copy2(path, tmp)
+            os.replace(tmp, path)
+        except OSError:
+            _remove(tmp)
+            _remove(path)  # The script will regenerate it.
+
+
+def store(root, key, outputs, limit=None):
+    """Copies outputs into the cache, then evicts entries over the limit.
+
+    Eviction walks the whole cache, so it only happens if it hasn’t in the
+    last EVICT_INTERVAL seconds.
+    """
+    entry = _entry(root, key)
+    if os.path.isdir(entry):
+        return
+    tmp = "%s.tmp-%d" % (entry, os.getpid())
+    os.makedirs(tmp)
+    try:
+        for i, path in enumerate(outputs):
+            shutil.copyfile(path, os.path.join(tmp, str(i)))
+        os.rename(tmp, entry)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return  # Another process stored the same entry first.
+    marker = os.path.join(root, ".last-evict")
+    try:
+        if time.time() - os.stat(marker).st_mtime < EVICT_INTERVAL:
+            return
+    except FileNotFoundError:
+        pass
+    open(marker, "w").close()
+    os.utime(marker)
+    evict(root, max_size() if limit is None else limit)
+
+
+def evict(root, limit):
+    """Deletes least recently used entries until the cache fits in limit."""
+    entries = []
+    total = 0
+    for prefix in os.listdir(root):
+        prefix = os.path.join(root, prefix)
+        if not os.path.isdir(prefix):
+            continue
+        for name in os.listdir(prefix):
+            path = os.path.join(prefix, name)
+            try:
+                size = sum(
+                    os.stat(os.path.join(path, f)).st_size for f in os.listdir(path)
+                )
+                entries.append((os.stat(path).st_mtime, size, path))
+            except OSError:
+                continue
+            total += size
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def _same_content(a, b):
+    try:
+        if os.path.samefile(a, b):
+            return True
+        if os.path.getsize(a) != os.path.getsize(b):
+            return False
+        with open(a, "rb") as fa, open(b, "rb") as fb:
+            return fa.read() == fb.read()
+    except OSError:
+        return False
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+#
+# Copyright 2016 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Runs a build action script, reusing its outputs from action_cache.
+
+    cached_action.py INPUT... --outputs OUTPUT... -- SCRIPT ARGS...
+
+Actions are routed through this wrapper when the GN arg use_action_cache
+is set (see action.gni). The outputs of SCRIPT are looked up in the cache
+first; on a miss, SCRIPT runs as __main__ in this process, so it costs no
+second interpreter, and its outputs are stored after it succeeds. Only use
+it for scripts whose outputs depend on nothing but the listed inputs and
+the arguments.
+"""
+
+import os
+import sys
+
+import action_cache
+
+
+def main():
+    inputs, outputs, argv = parse_args(sys.argv[1:])
+    script, args = argv[0], argv[1:]
+
+    cache = action_cache.cache_dir()
+    if cache:
+        # Any cache error is a miss; the script still runs.
+        try:
+            key = action_cache.key(script, inputs, args)
+            if action_cache.restore(cache, key, outputs):
+                sys.exit(0)
+            action_cache.unshare(outputs)
+        except OSError:
+            cache = None
+
+    status = run(script, args)
+    if cache and status == 0:
+        try:
+            action_cache.store(cache, key, outputs)
+        except OSError:
+            pass
+    sys.exit(status)
+
+
+def parse_args(argv):
+    split = argv.index("--")
+    paths, argv = argv[:split], argv[split + 1 :]
+    split = paths.index("--outputs")
+    return paths[:split], paths[split + 1 :], argv
+
+
+def run(script, args):
+    """Runs script as __main__ in this process; returns its exit status."""
+    import runpy
+
+    sys.argv = [script] + args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        elif isinstance(e.code, int):
+            return e.code
+        sys.stderr.write("%s\n" % e.code)
+        return 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    main()
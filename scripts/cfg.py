@@ -6,15 +6,15 @@
 
 import collections
 import contextlib
-import json
+import functools
 import os
-import platform
-import shlex
-import subprocess
 import sys
-import textwrap
 
+# Other modules are imported where they are used, so that importing cfg
+# from ./configure stays cheap. See test_cfg.test_import_time.
 
+
+@functools.lru_cache(maxsize=None)
 def host_os():
     if sys.platform == "darwin":
         return "mac"
@@ -24,7 +24,10 @@ def host_os():
     return "unknown"
 
 
+@functools.lru_cache(maxsize=None)
 def host_cpu():
+    import platform
+
     cpu = platform.uname()[4]
     if cpu == "x86_64":
         return "x64"
@@ -63,6 +66,7 @@ proto = collections.namedtuple("proto", "pretty prototype codename".split())
 _KNOWN_PROTOS = frozenset("debian fedora arch alpine suse gentoo slackware".split())
 
 
+@functools.lru_cache(maxsize=None)
 def dist_proto():
     """Returns a pair (pretty name, prototype, codename) based on os-release.
 
@@ -77,6 +81,8 @@ def dist_proto():
 
 
 def _detect_dist_proto(lines):
+    import shlex
+
     values = {}
     for line in lines:
         line = line.strip()
@@ -98,6 +104,9 @@ def _detect_dist_proto(lines):
 
 
 def check_bin(executable, args, *, what, input=None):
+    import shlex
+    import subprocess
+
     with step("checking for %s" % what) as msg:
         stdin = None
         if input is not None:
@@ -130,6 +139,9 @@ PKG_CONFIG_FLAGS = {
 
 
 def check_pkg(executable, lib):
+    import shlex
+    import subprocess
+
     flags = {}
     with step("checking for %s" % lib) as msg:
         try:
@@ -229,18 +241,38 @@ def makedirs(path):
             raise
 
 
-def gn(*, gn, ninja, **kwds):
+def gn(*, gn, ninja, ninja_jobs=None, compile_commands=True, **kwds):
+    """Runs gn gen in out/<target_os>/<mode> and points out/cur at it.
+
+    compile_commands may be False, to skip writing compile_commands.json,
+    True, to write it for every target, or a list (or comma-separated
+    string) of GN target names to limit it to. Names match the part after
+    the colon, so "foo" selects //x:foo and //y:foo; they are not label
+    patterns.
+
+    gn gen rewrites its compile_commands.json in the build dir on every
+    run, so that copy is only scratch. Editors read ./compile_commands.json,
+    which is replaced only when its content changes, so that tools watching
+    it don’t re-index after every configure. If ./compile_commands.json is a
+    symlink, it is the user’s, and is left alone; when compile_commands is
+    False, it is only deleted if it is still the copy that gn() wrote.
+    """
+    import shlex
+    import subprocess
+
     target_os = kwds["target_os"]
     mode = kwds["mode"]
     build_dir = os.path.join("out", target_os, mode)
     ninja_path = os.path.join(build_dir, "ninja")
     cur_path = os.path.join("out", "cur")
     cur_link = os.path.relpath(build_dir, os.path.dirname(cur_path))
+    gen_compdb_path = os.path.join(build_dir, "compile_commands.json")
+    compdb_path = "compile_commands.json"
 
     gn_args = _gn_dumps(kwds)
-    cmd = shlex.split(gn) + [
-        "gen",
-        "--export-compile-commands",
+    cmd = shlex.split(gn) + ["gen"]
+    cmd += _compile_commands_flags(compile_commands)
+    cmd += [
         "-q",
         build_dir,
         "--args=%s" % gn_args,
@@ -266,22 +298,135 @@ def gn(*, gn, ninja, **kwds):
         if retcode != 0:
             msg("failed", color="red")
             sys.exit(retcode)
+        if compile_commands:
+            if not os.path.islink(compdb_path):
+                with open(gen_compdb_path, "rb") as f:
+                    _write_if_changed(compdb_path, f.read())
+        else:
+            _remove_compdb(compdb_path, gen_compdb_path)
 
         if host_os() != "win":
             with open(ninja_path, "w") as f:
-                f.write(
-                    textwrap.dedent(
-                        """
-                        #!/bin/sh
-                        exec %s "$@"
-                        """
-                    ).lstrip()
-                    % ninja
-                )
+                f.write(_ninja_script(ninja, ninja_jobs))
             os.chmod(ninja_path, 0o755)
 
 
+def _compile_commands_flags(compile_commands):
+    if not compile_commands:
+        return []
+    elif compile_commands is True:
+        return ["--export-compile-commands"]
+    elif not isinstance(compile_commands, str):
+        compile_commands = ",".join(compile_commands)
+    return ["--export-compile-commands=%s" % compile_commands]
+
+
+def _remove_compdb(path, gen_path):
+    """Deletes gen_path, and path too if it is a copy of gen_path."""
+    try:
+        with open(gen_path, "rb") as f:
+            gen = f.read()
+    except FileNotFoundError:
+        return
+    try:
+        if not os.path.islink(path):
+            with open(path, "rb") as f:
+                if f.read() == gen:
+                    os.unlink(path)
+    except FileNotFoundError:
+        pass
+    os.unlink(gen_path)
+
+
+def _write_if_changed(path, data):
+    """Replaces path with data, unless it already has that content.
+
+    Returns True if it wrote path. The file is replaced atomically, so
+    watchers see one event and never a partial file.
+    """
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return True
+
+
+def add_compile_commands_args(parser):
+    """Adds --compile-commands and --no-compile-commands to a parser."""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--compile-commands",
+        dest="compile_commands",
+        nargs="?",
+        const=True,
+        default=True,
+        metavar="NAMES",
+        help="write compile_commands.json, optionally only for targets with "
+        "these comma-separated names, e.g. foo for //x:foo (default: all)",
+    )
+    group.add_argument(
+        "--no-compile-commands",
+        dest="compile_commands",
+        action="store_false",
+        help="don’t write compile_commands.json",
+    )
+
+
+def _ninja_script(ninja, jobs=None):
+    import textwrap
+
+    if jobs:
+        ninja = "%s -j %d" % (ninja, jobs)
+    return (
+        textwrap.dedent(
+            """
+            #!/bin/sh
+            exec %s "$@"
+            """
+        ).lstrip()
+        % ninja
+    )
+
+
+def print_config(argv=None):
+    """Answers --print-config from the saved config, without probing.
+
+    Call this at the top of ./configure, before anything else. If
+    --print-config is among the arguments, prints the GN args saved by the
+    last configure and exits.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if "--print-config" not in argv:
+        return
+    try:
+        sys.stdout.write(saved_config())
+    except OSError:
+        sys.stderr.write("not configured; run ./configure first\n")
+        sys.exit(1)
+    sys.exit(0)
+
+
+def saved_config(cur_path=os.path.join("out", "cur")):
+    """Returns the contents of args.gn in the build dir that gn() last used."""
+    build_dir = cur_path
+    if os.path.isfile(cur_path):
+        # On Windows, gn() writes the link target to a file instead.
+        with open(cur_path) as f:
+            build_dir = os.path.join(os.path.dirname(cur_path), f.read())
+    with open(os.path.join(build_dir, "args.gn")) as f:
+        return f.read()
+
+
 def _gn_dumps(obj):
+    import json
+
     if isinstance(obj, (str, int, float)):
         return json.dumps(obj)
     elif isinstance(obj, (tuple, list)):
@@ -311,6 +456,7 @@ Distro = collections.namedtuple(
 
 def install_or_check(distros):
     import argparse
+    import platform
 
     if platform.system() == "Darwin":
         distro, codename = "mac", None
@@ -329,9 +475,10 @@ def install_or_check(distros):
     parser.add_argument("--dry-run", action="store_const", const=True, default=False)
     args, flags = parser.parse_known_args()
 
+    prototype = args.distro if args.distro not in ["mac", "win"] else None
     distro = distros[args.distro]
     if args.action == "check":
-        if not check_all(distro=distro, codename=args.codename):
+        if not check_all(distro=distro, codename=args.codename, prototype=prototype):
             sys.exit(1)
     elif args.action == "install":
         install_all(
@@ -339,7 +486,90 @@ def install_or_check(distros):
         )
 
 
-def check_all(*, distro, codename, prefix=""):
+def _parse_dpkg_query(out):
+    # Yields both “name” and “name:arch”, so that requested packages match
+    # whether or not they carry an architecture qualifier.
+    for line in out.splitlines():
+        fields = line.split("\t")
+        if len(fields) == 3 and fields[2] == "installed":
+            name, arch, _ = fields
+            yield name
+            yield "%s:%s" % (name, arch)
+
+
+def _parse_names(out):
+    for line in out.splitlines():
+        fields = line.split()
+        if len(fields) == 1:
+            yield fields[0]
+
+
+def _parse_pacman(out):
+    for line in out.splitlines():
+        fields = line.split()
+        if len(fields) == 2:
+            yield fields[0]
+
+
+# Maps a dist_proto() prototype to a command that lists which of the
+# packages appended to it are installed, and a parser for its output.
+PACKAGE_QUERIES = {
+    "debian": (
+        [
+            "dpkg-query",
+            "-W",
+            "-f",
+            "${Package}\\t${Architecture}\\t${db:Status-Status}\\n",
+            "--",
+        ],
+        _parse_dpkg_query,
+    ),
+    "fedora": (["rpm", "-q", "--qf", "%{NAME}\\n", "--"], _parse_names),
+    "suse": (["rpm", "-q", "--qf", "%{NAME}\\n", "--"], _parse_names),
+    "arch": (["pacman", "-Q", "--"], _parse_pacman),
+    "alpine": (["apk", "info", "-e", "--"], _parse_names),
+}
+
+
+def query_packages(prototype, packages):
+    """Returns the subset of packages installed according to the package db.
+
+    All packages are resolved with a single dpkg-query, rpm, pacman, or apk
+    invocation, chosen by prototype. Returns None if prototype has no known
+    package database or it could not be queried; callers should fall back
+    to pkg-config in that case.
+    """
+    import subprocess
+
+    if prototype not in PACKAGE_QUERIES:
+        return None
+    command, parse = PACKAGE_QUERIES[prototype]
+    packages = sorted(set(packages))
+    if not packages:
+        return set()
+    try:
+        p = subprocess.Popen(
+            command + packages,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        out, _ = p.communicate()
+    except OSError:
+        return None
+    # These tools exit non-zero when any package is missing. If none were
+    # found either, the query itself may have failed, so don’t trust it.
+    installed = set(parse(out.decode("utf-8", "replace"))) & set(packages)
+    if p.returncode != 0 and not installed:
+        return None
+    return installed
+
+
+def check_all(*, distro, codename, prefix="", prototype=None):
+    """Checks for distro’s packages; returns a config, or None if missing.
+
+    prototype is the distros key that distro came from. It picks the package
+    database to query; None, for mac and win, skips straight to pkg-config.
+    """
     checkers = {
         "clang": check_clang,
         "clang++": check_clangxx,
@@ -348,6 +578,11 @@ def check_all(*, distro, codename, prefix=""):
         "pkg-config": check_pkg_config,
     }
 
+    installed = query_packages(
+        prototype,
+        (pkg for name, pkg in distro.packages.items() if name not in checkers),
+    )
+
     pkg_config = None
     missing_pkgs = []
     config = {}
@@ -361,6 +596,12 @@ def check_all(*, distro, codename, prefix=""):
             continue
 
         pkg_config = config.pop("pkg-config", pkg_config)
+        if installed is not None:
+            with step("checking for %s" % name) as msg:
+                if distro.packages[name] not in installed:
+                    msg("missing", color="red")
+                    missing_pkgs.append(name)
+            continue
         if pkg_config is None:
             continue
         if not check_pkg(pkg_config, name):
@@ -421,16 +662,23 @@ def install_all(*, distro, codename, dry_run=False, flags=[]):
 
 
 def _command(prefix, args):
+    import shlex
+
     return " ".join(shlex.quote(x) for x in shlex.split(prefix) + args)
 
 
 def _run(dry_run, command):
+    import shlex
+    import subprocess
+
     print(" ".join(shlex.quote(arg) for arg in command))
     if not dry_run:
         subprocess.check_call(command)
 
 
 def _write(dry_run, content, path):
+    import shlex
+
     print("+ tee %s" % shlex.quote(path))
     print(content)
     if not dry_run:
@@ -438,11 +686,229 @@ def _write(dry_run, content, path):
             f.write(content)
 
 
+OPT_PROFILES = collections.OrderedDict(
+    [
+        ("size", "-Os"),
+        ("speed", "-O2"),
+        ("max", "-O3"),
+    ]
+)
+
+
+def add_opt_args(parser):
+    """Adds --opt-profile, --march, etc. to an argparse parser.
+
+    The resulting opt_* values can be passed to configure() unchanged, and
+    become the GN args of the same names read by //build/lib:opt.
+    """
+    group = parser.add_argument_group("optimization")
+    group.add_argument(
+        "--opt-profile",
+        choices=list(OPT_PROFILES.keys()),
+        default="size",
+        help="optimize opt builds for size (-Os), speed (-O2), or max (-O3)",
+    )
+    group.add_argument(
+        "--march",
+        dest="opt_march",
+        default="",
+        help="CPU to tune opt builds for, as passed to -march",
+    )
+    group.add_argument(
+        "--frame-pointers",
+        dest="opt_frame_pointers",
+        action="store_true",
+        help="keep frame pointers in opt builds",
+    )
+    group.add_argument(
+        "--gc-sections",
+        dest="opt_gc_sections",
+        action="store_true",
+        help="discard unused functions and data at link time",
+    )
+
+
+def check_opt(config):
+    """Raises ValueError if the opt_* values in config are invalid."""
+    import re
+
+    profile = config.get("opt_profile", "size")
+    if profile not in OPT_PROFILES:
+        raise ValueError(
+            "opt_profile must be one of %s, not %r"
+            % (", ".join(OPT_PROFILES.keys()), profile)
+        )
+    march = config.get("opt_march", "")
+    if not (isinstance(march, str) and re.match(r"^[A-Za-z0-9_.+-]*$", march)):
+        raise ValueError("invalid opt_march: %r" % (march,))
+    for key in ["opt_frame_pointers", "opt_gc_sections"]:
+        if not isinstance(config.get(key, False), bool):
+            raise ValueError("%s must be a bool, not %r" % (key, config[key]))
+
+
+def check_march(march, default="clang"):
+    """Compile a basic C99 binary with -march."""
+    executable = os.getenv("CC", default)
+    return check_bin(
+        executable,
+        ["-x", "c", "-std=c99", "-march=" + march, "-", "-o", "/dev/null"],
+        what="-march=" + march,
+        input="int main() { return 1; }",
+    )
+
+
+RemoteExecutor = collections.namedtuple(
+    "RemoteExecutor", "launcher hosts_env port slots".split()
+)
+
+# Distributed compilers that can wrap cc and cxx. `hosts_env` names an
+# environment variable listing build nodes in distcc’s DISTCC_HOSTS syntax;
+# `slots` is the job count assumed for a node that doesn’t give one. icecc
+# finds nodes through its scheduler, which doesn’t report their capacity,
+# so it has no hosts_env and requires --remote-jobs.
+REMOTE_EXECUTORS = {
+    "distcc": RemoteExecutor("distcc", "DISTCC_HOSTS", 3632, 4),
+    "icecc": RemoteExecutor("icecc", None, None, None),
+}
+
+
+def add_remote_args(parser):
+    """Adds --remote and --remote-jobs to an argparse parser."""
+    group = parser.add_argument_group("distributed compilation")
+    group.add_argument(
+        "--remote",
+        choices=sorted(REMOTE_EXECUTORS.keys()),
+        default=None,
+        help="distribute compiles with this launcher",
+    )
+    group.add_argument(
+        "--remote-jobs",
+        type=int,
+        default=None,
+        help="ninja -j to use with --remote (default: capacity of reachable "
+        "hosts, or local CPUs + 2 if more; required for icecc)",
+    )
+
+
+def parse_remote_hosts(spec, *, port, slots):
+    """Returns [(host, port, slots)] from a DISTCC_HOSTS-style spec.
+
+    Options such as --randomize and zeroconf entries are skipped. “localhost”
+    runs jobs locally and defaults to 2 slots, like distcc. “@[user@]host”
+    entries are reached over SSH, so their port is 22.
+    """
+    import re
+
+    hosts = []
+    for token in spec.split():
+        if token.startswith(("-", "+")):
+            continue
+        if token.startswith("@"):
+            # @[USER@]HOST[/LIMIT][:COMMAND][,OPTIONS]
+            m = re.match(r"^@(?:[^@]+@)?([^:/,@]+)(?:/(\d+))?", token)
+            if m:
+                hosts.append((m.group(1), 22, int(m.group(2) or slots)))
+            continue
+        m = re.match(r"^(\[[^]]+\]|[^:/,]+)(?::(\d+))?(?:/(\d+))?(?:,.*)?$", token)
+        if not m:
+            continue
+        host = m.group(1).strip("[]")
+        host_slots = slots if host != "localhost" else 2
+        hosts.append(
+            (
+                host,
+                int(m.group(2) or port),
+                int(m.group(3) or host_slots),
+            )
+        )
+    return hosts
+
+
+def _reachable(host, port, timeout=0.5):
+    import socket
+
+    if host == "localhost":
+        return True
+    try:
+        socket.create_connection((host, port), timeout=timeout).close()
+        return True
+    except OSError:
+        return False
+
+
+def check_remote(name, *, jobs=None):
+    """Finds the reachable build nodes for a distributed compiler.
+
+    Returns config for configure(): the GN args compiler_launcher and
+    link_pool_depth, which keeps links on local CPUs, and ninja_jobs, the
+    total remote capacity unless overridden by `jobs`. ninja_jobs is never
+    below ninja’s own default of local CPUs + 2, so that a small pool of
+    nodes doesn’t throttle local work. Returns None if the
+    launcher is missing or no node can be reached, or, for executors whose
+    nodes can’t be listed (icecc), if `jobs` isn’t given.
+    """
+    executor = REMOTE_EXECUTORS[name]
+    launcher = check_bin(executor.launcher, ["--version"], what=name)
+    if launcher is None:
+        return None
+
+    if executor.hosts_env is None:
+        with step("checking %s jobs" % name) as msg:
+            if not jobs:
+                msg("unknown", color="red")
+                print("\n%s can’t report its capacity; pass --remote-jobs" % name)
+                return None
+            msg("%d jobs" % jobs, color="green")
+        return {
+            "compiler_launcher": launcher,
+            "link_pool_depth": os.cpu_count() or 1,
+            "ninja_jobs": jobs,
+        }
+
+    with step("checking %s hosts" % name) as msg:
+        hosts = parse_remote_hosts(
+            os.getenv(executor.hosts_env, ""), port=executor.port, slots=executor.slots
+        )
+        hosts = [h for h in hosts if _reachable(h[0], h[1])]
+        if not hosts:
+            msg("none reachable", color="red")
+            print("\nSet %s to a list of build nodes" % executor.hosts_env)
+            return None
+        capacity = sum(h[2] for h in hosts)
+        msg("%d jobs on %d hosts" % (capacity, len(hosts)), color="green")
+
+    return {
+        "compiler_launcher": launcher,
+        "link_pool_depth": os.cpu_count() or 1,
+        "ninja_jobs": jobs or max(capacity, (os.cpu_count() or 1) + 2),
+    }
+
+
 def configure(project, distros, config):
     for k, v in check_deps(project, distros, config).items():
         if k not in config:
             config[k] = v
 
+    with step("checking opt profile") as msg:
+        try:
+            check_opt(config)
+        except ValueError as e:
+            msg("invalid", color="red")
+            print("\n%s" % e)
+            sys.exit(1)
+        msg(config.get("opt_profile", "size"), color="green")
+    if config.get("opt_march") and host_os() != "win":
+        if not check_march(config["opt_march"], config.get("clang", "clang")):
+            sys.exit(1)
+
+    remote = config.pop("remote", None)
+    remote_jobs = config.pop("remote_jobs", None)
+    if remote is not None:
+        remote = check_remote(remote, jobs=remote_jobs)
+        if remote is None:
+            sys.exit(1)
+        config.update(remote)
+
     script_executable = "python3"
     if host_os() == "win":
         script_executable = "python"
@@ -485,6 +951,8 @@ def check_deps(project, distros, config):
 
 
 def check_mac(project, distros):
+    import platform
+
     with step("checking Mac OS X version") as msg:
         ver = platform.mac_ver()[0]
         ver = tuple(int(x) for x in ver.split(".")[:2])
@@ -529,7 +997,9 @@ def check_linux_native(project, distros):
         else:
             msg(pretty + " (untested)", color="yellow")
             distro = "debian"
-    config = check_all(distro=distros[distro], codename=codename, prefix="sudo")
+    config = check_all(
+        distro=distros[distro], codename=codename, prefix="sudo", prototype=distro
+    )
     if config is None:
         sys.exit(1)
     return config
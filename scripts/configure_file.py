@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+#
+# Copyright 2016 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Substitutes ${KEY} placeholders in template files.
+
+    configure_file.py SRC... DST... -- KEY=VAL...
+
+Each SRC is written to the DST in the same position. Outputs whose content
+would not change are left untouched, so ninja can restat them.
+"""
+
+import re
+import sys
+
+# Any ${...}; keys may contain characters such as “.” or “:”, as in Xcode’s
+# ${PRODUCT_NAME:rfc1034identifier}.
+PLACEHOLDER = re.compile(r"\$\{([^{}]+)\}")
+
+
+def main():
+    args = sys.argv[1:]
+    if "--" not in args:
+        fail("usage: configure_file.py SRC... DST... -- KEY=VAL...")
+    split = args.index("--")
+    paths, defines = args[:split], args[split + 1 :]
+    if len(paths) % 2:
+        fail("expected as many outputs as inputs")
+    half = len(paths) // 2
+
+    try:
+        subs = parse_defines(defines)
+    except ValueError as e:
+        fail(str(e))
+    for src, dst in zip(paths[:half], paths[half:]):
+        with open(src) as f:
+            data = f.read()
+        try:
+            data = substitute(data, subs)
+        except KeyError as e:
+            fail("%s: undefined key %s" % (src, e.args[0]))
+        write_if_changed(dst, data)
+
+
+def parse_defines(defines):
+    subs = {}
+    for define in defines:
+        if "=" not in define:
+            raise ValueError("expected KEY=VALUE, not %r" % define)
+        key, val = define.split("=", 1)
+        subs[key] = val
+    return subs
+
+
+def substitute(data, subs, strict=True):
+    """Replaces every ${KEY} in data in one pass.
+
+    If strict, an undefined KEY raises KeyError; otherwise it is kept as-is.
+    """
+    if strict:
+        return PLACEHOLDER.sub(lambda m: subs[m.group(1)], data)
+    return PLACEHOLDER.sub(lambda m: subs.get(m.group(1), m.group(0)), data)
+
+
+def write_if_changed(path, data):
+    try:
+        with open(path) as f:
+            if f.read() == data:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    with open(path, "w") as f:
+        f.write(data)
+    return True
+
+
+def fail(message):
+    sys.stderr.write("configure_file.py: %s\n" % message)
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
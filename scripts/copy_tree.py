@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+#
+# Copyright 2016 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Copies a file or directory tree, hardlinking where possible.
+
+    copy_tree.py SRC DST
+
+DST becomes a mirror of SRC. Files are hardlinked when SRC and DST are on
+the same filesystem and copied otherwise; symlinks are recreated. Either
+way, mtimes match SRC, and files already linked to SRC are left alone, so
+ninja’s restat can skip downstream work.
+"""
+
+import os
+import shutil
+import sys
+
+
+def main():
+    progname, src, dst = sys.argv
+    copy(src, dst)
+
+
+def copy(src, dst):
+    if os.path.islink(src):
+        _remove(dst)
+        os.symlink(os.readlink(src), dst)
+    elif os.path.isdir(src):
+        copy_tree(src, dst)
+    else:
+        copy_file(src, dst)
+
+
+def copy_file(src, dst):
+    try:
+        if os.path.samefile(src, dst):
+            return
+    except OSError:
+        pass
+    _remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def copy_tree(src, dst):
+    if os.path.islink(dst) or (os.path.exists(dst) and not os.path.isdir(dst)):
+        _remove(dst)
+    if not os.path.isdir(dst):
+        os.makedirs(dst)
+
+    names = set(os.listdir(src))
+    for name in os.listdir(dst):
+        if name not in names:
+            _remove(os.path.join(dst, name))
+    for name in sorted(names):
+        copy(os.path.join(src, name), os.path.join(dst, name))
+    shutil.copystat(src, dst)
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+#
+# Copyright 2016 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Reports where the bytes in linked ELF outputs come from.
+
+    size_report.py report out/cur
+    size_report.py report --json out/cur > before.json
+    size_report.py diff before.json out/cur
+
+Bytes are attributed to sections (size -A), symbols (nm -S), translation
+units (readelf .debug_aranges, falling back to nm -l) and to blobs generated
+by the embed() template. Only binutils are required.
+"""
+
+import argparse
+import bisect
+import collections
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+
+NM = os.getenv("NM", "nm")
+SIZE = os.getenv("SIZE", "size")
+READELF = os.getenv("READELF", "readelf")
+
+EMBED_HEADER = "// THIS FILE WAS AUTOMATICALLY GENERATED; DO NOT EDIT\n"
+UNKNOWN = "[unknown]"
+
+Symbol = collections.namedtuple("Symbol", "name kind address size path".split())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report binary size bloat")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    report = sub.add_parser("report", help="report sizes of a build")
+    report.add_argument("path", help="binary, root_out_dir, or saved report")
+    report.add_argument("--json", action="store_true", help="print raw JSON")
+    report.add_argument("--top", type=int, default=20, help="rows per table")
+
+    diff = sub.add_parser("diff", help="compare two builds")
+    diff.add_argument("old", help="binary, root_out_dir, or saved report")
+    diff.add_argument("new", help="binary, root_out_dir, or saved report")
+    diff.add_argument("--top", type=int, default=20, help="rows per table")
+
+    args = parser.parse_args()
+    if args.command == "report":
+        data = load(args.path)
+        if args.json:
+            json.dump(data, sys.stdout, indent=2, sort_keys=True)
+            sys.stdout.write("\n")
+        else:
+            print_report(data, top=args.top)
+    elif args.command == "diff":
+        print_diff(load(args.old), load(args.new), top=args.top)
+
+
+def load(path):
+    """Returns a report for `path`.
+
+    `path` may be a saved JSON report, a single ELF binary, or a
+    root_out_dir, in which case every ELF file directly inside it is
+    measured and embed() blobs are looked up in its gen/ directory.
+    """
+    if os.path.isdir(path):
+        binaries = sorted(
+            os.path.join(path, name)
+            for name in os.listdir(path)
+            if is_elf(os.path.join(path, name))
+        )
+        blobs = find_embedded_blobs(os.path.join(path, "gen"))
+        return {os.path.basename(b): analyze(b, blobs) for b in binaries}
+    elif is_elf(path):
+        blobs = find_embedded_blobs(os.path.join(os.path.dirname(path), "gen"))
+        return {os.path.basename(path): analyze(path, blobs)}
+    with open(path) as f:
+        return json.load(f)
+
+
+def is_elf(path):
+    if not os.path.isfile(path):
+        return False
+    with open(path, "rb") as f:
+        return f.read(4) == b"\x7fELF"
+
+
+def analyze(binary, blobs=None):
+    """Measures a single ELF binary.
+
+    Returns a dict of {"total", "sections", "symbols", "units", "blobs"},
+    each of the latter mapping a name to a byte count.
+    """
+    if blobs is None:
+        blobs = {}
+    sections = read_sections(binary)
+    symbols = read_symbols(binary)
+    ranges = read_unit_ranges(binary)
+    starts = [start for start, _, _ in ranges]
+
+    by_symbol = collections.Counter()
+    by_unit = collections.Counter()
+    by_blob = collections.Counter()
+    for sym in symbols:
+        unit = unit_for(sym, ranges, starts)
+        if sym.name in blobs:
+            by_blob[sym.name] += sym.size
+            if unit == UNKNOWN:
+                unit = blobs[sym.name]
+        by_symbol[sym.name] += sym.size
+        by_unit[unit] += sym.size
+
+    return {
+        "total": sum(sections.values()),
+        "sections": dict(sections),
+        "symbols": dict(by_symbol),
+        "units": dict(by_unit),
+        "blobs": dict(by_blob),
+    }
+
+
+def read_sections(binary):
+    """Returns {section: size} for allocated sections, via size -A."""
+    out = _check_output(SIZE, ["-A", "-d", binary])
+    sections = collections.OrderedDict()
+    for line in out.splitlines():
+        fields = line.split()
+        if len(fields) != 3 or not fields[0].startswith("."):
+            continue
+        name, size, addr = fields
+        if int(addr) == 0:
+            continue  # not loaded: .comment, .debug_*, etc.
+        sections[name] = int(size)
+    return sections
+
+
+def read_symbols(binary):
+    """Returns sized, defined symbols from nm, demangled, with source paths."""
+    out = _check_output(NM, ["-S", "-C", "-l", "--size-sort", binary])
+    return list(parse_nm(out))
+
+
+def parse_nm(out):
+    for line in out.splitlines():
+        line, _, path = line.partition("\t")
+        fields = line.split(None, 3)
+        if len(fields) != 4:
+            continue
+        address, size, kind, name = fields
+        if kind in "UuwvN":
+            continue
+        path = re.sub(r":\d+$", "", path) or None
+        yield Symbol(name, kind, int(address, 16), int(size, 16), path)
+
+
+def read_unit_ranges(binary):
+    """Returns sorted [(start, end, unit name)] from the binary’s DWARF.
+
+    .debug_aranges maps code addresses to compilation unit offsets; the
+    unit names at those offsets come from a depth-1 .debug_info dump.
+    Binaries without debug info return an empty list.
+    """
+    try:
+        names = parse_units(
+            _check_output(READELF, ["--debug-dump=info", "--dwarf-depth=1", binary])
+        )
+        aranges = _check_output(READELF, ["--debug-dump=aranges", binary])
+    except subprocess.CalledProcessError:
+        return []
+    return sorted(
+        (start, start + length, names.get(offset, UNKNOWN))
+        for offset, start, length in parse_aranges(aranges)
+    )
+
+
+def parse_units(out):
+    names = {}
+    offset = comp_dir = name = None
+    for line in out.splitlines() + ["  Compilation Unit @ offset -1:"]:
+        m = re.match(r"\s*Compilation Unit @ offset (0x[0-9a-f]+|\d+|-1):", line)
+        if m:
+            if offset is not None and name is not None:
+                names[offset] = os.path.normpath(os.path.join(comp_dir or "", name))
+            offset, comp_dir, name = int(m.group(1), 0), None, None
+            continue
+        m = re.match(r"\s*<[0-9a-f]+>\s+DW_AT_(name|comp_dir)\s*:(.*)$", line)
+        if m:
+            # Strings may be prefixed with “(indirect string, offset: 0x…): ”
+            value = re.sub(r"^\s*\([^)]*\):\s*", "", m.group(2)).strip()
+            if m.group(1) == "name" and name is None:
+                name = value
+            elif m.group(1) == "comp_dir" and comp_dir is None:
+                comp_dir = value
+    return names
+
+
+def parse_aranges(out):
+    offset = None
+    for line in out.splitlines():
+        m = re.match(r"\s*Offset into \.debug_info:\s*(0x[0-9a-f]+|\d+)", line)
+        if m:
+            offset = int(m.group(1), 0)
+            continue
+        m = re.match(r"\s*([0-9a-f]{8,})\s+([0-9a-f]{8,})\s*$", line)
+        if m and offset is not None:
+            start, length = int(m.group(1), 16), int(m.group(2), 16)
+            if length:
+                yield offset, start, length
+
+
+def unit_for(sym, ranges, starts=None):
+    """Returns the unit whose range contains sym, or else its nm -l path.
+
+    `ranges` must be sorted; `starts` is the list of their start addresses,
+    which callers should compute once and pass for every symbol.
+    """
+    if starts is None:
+        starts = [start for start, _, _ in ranges]
+    i = bisect.bisect_right(starts, sym.address) - 1
+    if i >= 0:
+        start, end, name = ranges[i]
+        if sym.address < end:
+            return name
+    return sym.path or UNKNOWN
+
+
+def find_embedded_blobs(gen_dir):
+    """Returns {qualified symbol: source path} for embed() outputs in gen_dir."""
+    blobs = {}
+    if not os.path.isdir(gen_dir):
+        return blobs
+    for root, dirs, files in os.walk(gen_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            symbol = read_embedded_symbol(path)
+            if symbol:
+                blobs[symbol] = path
+    return blobs
+
+
+def read_embedded_symbol(path):
+    """Returns the qualified symbol defined by an embed.py source, if any."""
+    try:
+        with open(path) as f:
+            if f.readline() != EMBED_HEADER:
+                return None
+            namespaces = []
+            for line in f:
+                m = re.match(r"namespace (\S+) \{$", line)
+                if m:
+                    namespaces.append(m.group(1))
+                m = re.match(r"extern const char (\S+)\[\] =$", line)
+                if m:
+                    return "::".join(namespaces + [m.group(1)])
+    except (OSError, UnicodeDecodeError):
+        pass
+    return None
+
+
+def print_report(data, *, top):
+    for binary, report in sorted(data.items()):
+        print("%s: %s bytes" % (binary, _format_int(report["total"])))
+        for key in ["sections", "units", "blobs", "symbols"]:
+            _print_table(key, report[key].items(), top=top)
+        print()
+
+
+def print_diff(old, new, *, top):
+    for binary in sorted(set(old) | set(new)):
+        a = old.get(binary, _EMPTY)
+        b = new.get(binary, _EMPTY)
+        delta = b["total"] - a["total"]
+        print(
+            "%s: %s -> %s bytes (%s)"
+            % (
+                binary,
+                _format_int(a["total"]),
+                _format_int(b["total"]),
+                _format_delta(delta),
+            )
+        )
+        for key in ["sections", "units", "blobs", "symbols"]:
+            changes = diff_counts(a[key], b[key])
+            _print_table(key, changes, top=top, signed=True)
+        print()
+
+
+def diff_counts(old, new):
+    """Returns [(name, new - old)] for every name whose size changed."""
+    changes = []
+    for name in set(old) | set(new):
+        delta = new.get(name, 0) - old.get(name, 0)
+        if delta:
+            changes.append((name, delta))
+    return changes
+
+
+_EMPTY = {"total": 0, "sections": {}, "symbols": {}, "units": {}, "blobs": {}}
+
+
+def _print_table(title, rows, *, top, signed=False):
+    rows = sorted(rows, key=lambda row: (-abs(row[1]), row[0]))
+    if not rows:
+        return
+    print("  %s:" % title)
+    fmt = _format_delta if signed else _format_int
+    for name, size in rows[:top]:
+        print("    %12s  %s" % (fmt(size), name))
+    if len(rows) > top:
+        rest = sum(size for _, size in rows[top:])
+        print("    %12s  (%d more)" % (fmt(rest), len(rows) - top))
+
+
+def _format_int(n):
+    return "{:,}".format(n)
+
+
+def _format_delta(n):
+    return "{:+,}".format(n)
+
+
+def _check_output(executable, args):
+    out = subprocess.check_output(
+        shlex.split(executable) + args, stderr=subprocess.DEVNULL
+    )
+    return out.decode("utf-8", "replace")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+import action_cache
+
+WRAPPER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cached_action.py")
+EMBED = os.path.join(os.path.dirname(os.path.abspath(__file__)), "embed.py")
+
+
+def _cached_embed(build_dir, env):
+    os.makedirs(str(build_dir / "gen"), exist_ok=True)
+    outputs = ["gen/a.h", "gen/a.cc"]
+    subprocess.check_call(
+        [sys.executable, WRAPPER, EMBED, "../in.txt", "--outputs"]
+        + outputs
+        + ["--", EMBED, "../in.txt"]
+        + outputs
+        + ["a::b"],
+        cwd=str(build_dir),
+        env=env,
+    )
+    return [str(build_dir / path) for path in outputs]
+
+
+def test_run(tmp_path):
+    (tmp_path / "in.txt").write_text('quote " tab \t\n')
+    env = dict(os.environ, GN_TOOLS_CACHE_DIR="")
+
+    # Without a cache, the wrapper just runs the script.
+    subprocess.check_call(
+        [sys.executable, EMBED, "in.txt", "a.h", "a.cc", "a::b"], cwd=str(tmp_path)
+    )
+    direct = (tmp_path / "a.cc").read_bytes()
+    wrapped = _cached_embed(tmp_path / "out", env)
+    assert open(wrapped[1], "rb").read() == direct
+
+    out = subprocess.run(
+        [sys.executable, WRAPPER, "missing.txt", "--outputs", "--"]
+        + [EMBED, "missing.txt", "y.h", "y.cc", "a::b"],
+        cwd=str(tmp_path),
+        env=env,
+        stderr=subprocess.PIPE,
+    )
+    assert out.returncode == 1
+    assert b"FileNotFoundError" in out.stderr
+
+
+def test_cache(tmp_path):
+    (tmp_path / "in.txt").write_text("data\n")
+    cache = tmp_path / "cache"
+    env = dict(os.environ, GN_TOOLS_CACHE_DIR=str(cache))
+
+    dev = _cached_embed(tmp_path / "dev", env)
+    assert all(os.stat(path).st_nlink == 1 for path in dev)
+
+    # A fresh build dir is restored from the cache by hardlink.
+    opt = _cached_embed(tmp_path / "opt", env)
+    assert all(os.stat(path).st_nlink == 2 for path in opt)
+    for a, b in zip(dev, opt):
+        assert open(a).read() == open(b).read()
+
+    # Restoring into another build dir leaves the shared inode’s mtime alone.
+    for path in opt:
+        os.utime(path, (1, 1))
+    rel = _cached_embed(tmp_path / "rel", env)
+    assert all(os.stat(path).st_nlink == 3 for path in rel)
+    assert all(os.stat(path).st_mtime == 1 for path in opt)
+
+    # An existing output with other content gets a fresh copy, newer than
+    # anything built from the old content.
+    with open(dev[1], "w") as f:
+        f.write("stale\n")
+    os.utime(dev[1], (1, 1))
+    _cached_embed(tmp_path / "dev", env)
+    assert open(dev[1]).read() == open(opt[1]).read()
+    assert os.stat(dev[1]).st_nlink == 1
+    assert os.stat(dev[1]).st_mtime > 1
+    assert os.stat(opt[1]).st_mtime == 1
+
+    # Rerunning the script doesn’t write through the link into the cache.
+    action_cache.unshare(opt)
+    assert all(os.stat(path).st_nlink == 1 for path in opt)
+
+    # A changed input misses.
+    (tmp_path / "in.txt").write_text("other data\n")
+    dbg = _cached_embed(tmp_path / "dbg", env)
+    assert all(os.stat(path).st_nlink == 1 for path in dbg)
+    assert "other data" in open(dbg[1]).read()
+
+    entries = [p for d in cache.iterdir() if d.is_dir() for p in d.iterdir()]
+    assert len(entries) == 2
+    os.utime(str(entries[0]), (0, 0))
+    newest = sum(f.stat().st_size for f in entries[1].iterdir())
+    action_cache.evict(str(cache), newest)
+    assert [p.exists() for p in entries] == [False, True]
+
+
+def test_cache_unwritable(tmp_path):
+    (tmp_path / "in.txt").write_text("data\n")
+    (tmp_path / "file").write_text("")
+    env = dict(os.environ, GN_TOOLS_CACHE_DIR=str(tmp_path / "file" / "cache"))
+    # Cache errors are misses; the script runs anyway.
+    dev = _cached_embed(tmp_path / "dev", env)
+    assert "data" in open(dev[1]).read()
+
+
+def test_cache_size(monkeypatch):
+    monkeypatch.delenv("GN_TOOLS_CACHE_SIZE", raising=False)
+    assert action_cache.max_size() == 1 << 30
+    monkeypatch.setenv("GN_TOOLS_CACHE_SIZE", "64m")
+    assert action_cache.max_size() == 64 << 20
+    for size in ["1.5G", "1GB", "lots"]:
+        monkeypatch.setenv("GN_TOOLS_CACHE_SIZE", size)
+        assert action_cache.max_size() == 1 << 30
+    monkeypatch.setenv("GN_TOOLS_CACHE_DIR", "")
+    assert action_cache.cache_dir() is None
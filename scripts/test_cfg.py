@@ -5,6 +5,7 @@
 # found in the LICENSE file.
 
 import os
+import subprocess
 import sys
 
 sys.path.insert(0, os.path.dirname(__file__))
@@ -123,3 +124,345 @@ def test_rasbpian_proto():
     assert detect(UNKNOWN) == cfg.proto("Crazy Other Linux", "unknown", "unknown")
 
     assert detect([]) == cfg.proto("Unknown", "unknown", "unknown")
+
+
+def test_check_opt():
+    cfg.check_opt({})
+    cfg.check_opt(
+        {
+            "opt_profile": "max",
+            "opt_march": "x86-64-v3",
+            "opt_frame_pointers": True,
+            "opt_gc_sections": False,
+        }
+    )
+
+    for bad in [
+        {"opt_profile": "fast"},
+        {"opt_march": "native; rm -rf /"},
+        {"opt_march": None},
+        {"opt_gc_sections": "yes"},
+    ]:
+        try:
+            cfg.check_opt(bad)
+        except ValueError:
+            pass
+        else:
+            assert False, bad
+
+
+def test_opt_args():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    cfg.add_opt_args(parser)
+    args = vars(parser.parse_args(["--opt-profile=speed", "--gc-sections"]))
+    assert args == {
+        "opt_profile": "speed",
+        "opt_march": "",
+        "opt_frame_pointers": False,
+        "opt_gc_sections": True,
+    }
+    assert cfg._gn_dumps(args) == "\n".join(
+        [
+            'opt_profile = "speed"',
+            'opt_march = ""',
+            "opt_frame_pointers = false",
+            "opt_gc_sections = true",
+        ]
+    )
+
+
+def test_import_time():
+    # Importing cfg must not pull in modules that are only needed once
+    # configure starts probing; ./configure --print-config relies on it.
+    code = "\n".join(
+        [
+            "import sys",
+            "sys.path.insert(0, %r)" % os.path.dirname(os.path.abspath(__file__)),
+            "before = set(sys.modules)",
+            "import cfg",
+            "print(' '.join(sorted(set(sys.modules) - before)))",
+        ]
+    )
+    out = subprocess.check_output([sys.executable, "-c", code]).decode("utf-8")
+    modules = set(out.split())
+    for heavy in ["json", "platform", "shlex", "subprocess", "textwrap"]:
+        assert heavy not in modules, heavy
+
+
+def test_host_memoized(monkeypatch):
+    import builtins
+    import platform
+
+    calls = []
+
+    def uname():
+        calls.append("uname")
+        return platform.uname_result("Linux", "host", "6.0", "#1", "x86_64")
+
+    def open_(path, *args, **kwds):
+        calls.append(path)
+        raise FileNotFoundError(path)
+
+    for f in [cfg.host_os, cfg.host_cpu, cfg.dist_proto]:
+        f.cache_clear()
+    monkeypatch.setattr(platform, "uname", uname)
+    monkeypatch.setattr(builtins, "open", open_)
+    monkeypatch.setattr(sys, "platform", "linux")
+    try:
+        assert cfg.host_cpu() == "x64"
+        assert cfg.dist_proto().prototype == "unknown"
+        assert cfg.host_os() == "linux"
+        assert calls == ["uname", "/etc/os-release"]
+
+        monkeypatch.setattr(sys, "platform", "darwin")
+        assert cfg.host_cpu() == "x64"
+        assert cfg.dist_proto().prototype == "unknown"
+        assert cfg.host_os() == "linux"
+        assert calls == ["uname", "/etc/os-release"]
+    finally:
+        for f in [cfg.host_os, cfg.host_cpu, cfg.dist_proto]:
+            f.cache_clear()
+
+
+def test_saved_config(tmp_path):
+    build_dir = tmp_path / "out" / "linux" / "opt"
+    build_dir.mkdir(parents=True)
+    (build_dir / "args.gn").write_text('mode = "opt"\n')
+    cur_path = tmp_path / "out" / "cur"
+
+    cur_path.symlink_to(os.path.join("linux", "opt"))
+    assert cfg.saved_config(str(cur_path)) == 'mode = "opt"\n'
+
+    cur_path.unlink()
+    cur_path.write_text(os.path.join("linux", "opt"))
+    assert cfg.saved_config(str(cur_path)) == 'mode = "opt"\n'
+
+
+def _stub(tmp_path, monkeypatch, name, script):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir(exist_ok=True)
+    path = bin_dir / name
+    path.write_text("#!/bin/sh\n" + script)
+    path.chmod(0o755)
+    monkeypatch.setenv("PATH", str(bin_dir))
+
+
+def test_query_packages(tmp_path, monkeypatch):
+    _stub(
+        tmp_path,
+        monkeypatch,
+        "dpkg-query",
+        'printf "%%s\\n" "$*" >> "%s"\n'
+        "printf 'libpng-dev\\tamd64\\tinstalled\\n'\n"
+        "printf 'zlib1g-dev\\tamd64\\tconfig-files\\n'\n"
+        "printf 'libc6\\ti386\\tinstalled\\n'\n"
+        "exit 1\n" % (tmp_path / "calls"),
+    )
+    packages = ["libpng-dev", "zlib1g-dev", "libsdl2-dev", "libpng-dev"]
+    packages += ["libc6:i386", "libpng-dev:amd64", "libpng-dev:i386"]
+    assert cfg.query_packages("debian", packages) == {
+        "libpng-dev",
+        "libpng-dev:amd64",
+        "libc6:i386",
+    }
+    assert (tmp_path / "calls").read_text().count("\n") == 1
+
+    _stub(
+        tmp_path,
+        monkeypatch,
+        "rpm",
+        "echo libpng-devel\necho package zlib-devel is not installed\nexit 1\n",
+    )
+    assert cfg.query_packages("fedora", ["libpng-devel", "zlib-devel"]) == {
+        "libpng-devel"
+    }
+
+    _stub(tmp_path, monkeypatch, "pacman", "echo 'libpng 1.6.37-3'\nexit 1\n")
+    assert cfg.query_packages("arch", ["libpng", "zlib"]) == {"libpng"}
+
+    _stub(tmp_path, monkeypatch, "apk", "echo zlib-dev\nexit 1\n")
+    assert cfg.query_packages("alpine", ["libpng-dev", "zlib-dev"]) == {"zlib-dev"}
+
+    # Ambiguous: unknown distro, missing tool, or a failure with no results.
+    assert cfg.query_packages("gentoo", ["libpng"]) is None
+    monkeypatch.setenv("PATH", str(tmp_path / "empty"))
+    assert cfg.query_packages("debian", ["libpng-dev"]) is None
+    _stub(tmp_path, monkeypatch, "pacman", "exit 1\n")
+    assert cfg.query_packages("arch", ["libpng"]) is None
+
+
+def test_check_all_package_db(tmp_path, monkeypatch, capsys):
+    _stub(
+        tmp_path,
+        monkeypatch,
+        "dpkg-query",
+        "printf 'libpng-dev\\tamd64\\tinstalled\\n'\nexit 1\n",
+    )
+    distro = cfg.Distro(
+        name="Debian",
+        packages={"libpng": "libpng-dev", "zlib": "zlib1g-dev"},
+        sources=[],
+        install=["apt-get", "install"],
+        update=None,
+        add_key=None,
+    )
+    assert cfg.check_all(distro=distro, codename="sid", prototype="debian") is None
+    out = capsys.readouterr().out
+    assert "missing dependencies: zlib1g-dev" in out
+
+    distro.packages.pop("zlib")
+    assert cfg.check_all(distro=distro, codename="sid", prototype="debian") == {}
+
+    # Without a prototype (mac, win), neither os-release nor the package db
+    # is consulted.
+    monkeypatch.setattr(cfg, "dist_proto", None)
+    capsys.readouterr()
+    monkeypatch.setenv("PATH", str(tmp_path / "empty"))
+    assert cfg.check_all(distro=distro, codename="mac") == {}
+    assert "checking for libpng" not in capsys.readouterr().out
+
+
+def test_parse_remote_hosts():
+    parse = cfg.parse_remote_hosts
+    assert parse("", port=3632, slots=4) == []
+    assert parse(
+        "--randomize localhost/3 build1 build2:4000/16 @build3/8,lzo +zeroconf "
+        "@me@build4:/opt/bin/distccd",
+        port=3632,
+        slots=4,
+    ) == [
+        ("localhost", 3632, 3),
+        ("build1", 3632, 4),
+        ("build2", 4000, 16),
+        ("build3", 22, 8),
+        ("build4", 22, 4),
+    ]
+
+
+def test_check_remote(tmp_path, monkeypatch):
+    import socket
+
+    # Stand-in daemon: accepts connections on localhost, like distccd.
+    daemon = socket.socket()
+    daemon.bind(("127.0.0.1", 0))
+    daemon.listen(4)
+    closed = socket.socket()
+    closed.bind(("127.0.0.1", 0))
+    up, down = daemon.getsockname()[1], closed.getsockname()[1]
+    closed.close()
+
+    _stub(tmp_path, monkeypatch, "distcc", "exit 0\n")
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
+    try:
+        hosts = "127.0.0.1:%d/12 127.0.0.1:%d/8" % (up, down)
+        monkeypatch.setenv("DISTCC_HOSTS", hosts)
+        assert cfg.check_remote("distcc") == {
+            "compiler_launcher": "distcc",
+            "link_pool_depth": 4,
+            "ninja_jobs": 12,
+        }
+        assert cfg.check_remote("distcc", jobs=30)["ninja_jobs"] == 30
+
+        # Fewer remote slots than local CPUs doesn’t lower -j.
+        monkeypatch.setattr(os, "cpu_count", lambda: 32)
+        assert cfg.check_remote("distcc")["ninja_jobs"] == 34
+
+        monkeypatch.setenv("DISTCC_HOSTS", "127.0.0.1:%d/8" % down)
+        assert cfg.check_remote("distcc") is None
+    finally:
+        daemon.close()
+
+    # icecc’s scheduler doesn’t report capacity, so --remote-jobs is required.
+    _stub(tmp_path, monkeypatch, "icecc", "exit 0\n")
+    assert cfg.check_remote("icecc") is None
+    assert cfg.check_remote("icecc", jobs=40) == {
+        "compiler_launcher": "icecc",
+        "link_pool_depth": 32,
+        "ninja_jobs": 40,
+    }
+
+
+def test_ninja_script():
+    assert cfg._ninja_script("ninja") == '#!/bin/sh\nexec ninja "$@"\n'
+    assert cfg._ninja_script("ninja", 48) == '#!/bin/sh\nexec ninja -j 48 "$@"\n'
+
+
+def test_compile_commands_args():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    cfg.add_compile_commands_args(parser)
+    parse = lambda *args: parser.parse_args(args).compile_commands
+    flags = lambda *args: cfg._compile_commands_flags(parse(*args))
+
+    assert flags() == ["--export-compile-commands"]
+    assert flags("--compile-commands") == ["--export-compile-commands"]
+    assert flags("--compile-commands=antares,libsfz") == [
+        "--export-compile-commands=antares,libsfz"
+    ]
+    assert flags("--no-compile-commands") == []
+    assert cfg._compile_commands_flags(["foo", "bar"]) == [
+        "--export-compile-commands=foo,bar"
+    ]
+
+
+def test_write_compile_commands_if_changed(tmp_path):
+    path = str(tmp_path / "compile_commands.json")
+    assert cfg._write_if_changed(path, b"[]\n")
+
+    os.utime(path, (1000, 1000))
+    inode = os.stat(path).st_ino
+    assert not cfg._write_if_changed(path, b"[]\n")
+    assert os.stat(path).st_mtime == 1000
+    assert os.stat(path).st_ino == inode
+
+    assert cfg._write_if_changed(path, b'[{"file": "a.c"}]\n')
+    with open(path, "rb") as f:
+        assert f.read() == b'[{"file": "a.c"}]\n'
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_gn_compile_commands(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    gn = tmp_path / "gn"
+    gn.write_text(
+        "#!/bin/sh\n"
+        "mkdir -p out/linux/dev\n"
+        'if [ "$2" = --export-compile-commands ]; then\n'
+        '  echo "[]" > out/linux/dev/compile_commands.json\n'
+        "fi\n"
+    )
+    gn.chmod(0o755)
+    run = lambda compile_commands: cfg.gn(
+        gn=str(gn),
+        ninja="ninja",
+        compile_commands=compile_commands,
+        target_os="linux",
+        mode="dev",
+    )
+
+    run(True)
+    assert (tmp_path / "compile_commands.json").read_text() == "[]\n"
+    os.utime("compile_commands.json", (1000, 1000))
+    run(True)
+    assert os.stat("compile_commands.json").st_mtime == 1000
+
+    run(False)
+    assert not os.path.exists("compile_commands.json")
+    assert not os.path.exists("out/linux/dev/compile_commands.json")
+
+    # A compile_commands.json that gn() didn’t write is the user’s.
+    run(True)
+    with open("compile_commands.json", "w") as f:
+        f.write('[{"file": "mine.c"}]\n')
+    run(False)
+    assert os.path.exists("compile_commands.json")
+    assert not os.path.exists("out/linux/dev/compile_commands.json")
+
+    os.unlink("compile_commands.json")
+    os.symlink("elsewhere.json", "compile_commands.json")
+    run(True)
+    run(False)
+    assert os.readlink("compile_commands.json") == "elsewhere.json"
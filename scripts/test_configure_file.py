@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+import configure_file
+
+
+def test_substitute():
+    subs = configure_file.parse_defines(["A=1", "B=${A}", "C=x=y"])
+    assert subs == {"A": "1", "B": "${A}", "C": "x=y"}
+
+    # Values are not substituted again.
+    assert configure_file.substitute("${A}${B}$C ${C}", subs) == "1${A}$C x=y"
+
+    try:
+        configure_file.substitute("${A} ${D}", subs)
+    except KeyError as e:
+        assert e.args == ("D",)
+    else:
+        assert False
+    assert configure_file.substitute("${A} ${D}", subs, strict=False) == "1 ${D}"
+
+    # Keys aren’t limited to identifiers, as with copy_info_plist.py’s
+    # original str.replace().
+    subs = configure_file.parse_defines(["FOO.BAR=x", "NAME:rfc1034identifier=y"])
+    data = "${FOO.BAR} ${NAME:rfc1034identifier} ${NAME}"
+    assert configure_file.substitute(data, subs, strict=False) == "x y ${NAME}"
+
+    try:
+        configure_file.parse_defines(["NOVALUE"])
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_write_if_changed(tmp_path):
+    path = str(tmp_path / "out.h")
+    assert configure_file.write_if_changed(path, "a\n")
+    os.utime(path, (0, 0))
+    assert not configure_file.write_if_changed(path, "a\n")
+    assert os.stat(path).st_mtime == 0
+    assert configure_file.write_if_changed(path, "b\n")
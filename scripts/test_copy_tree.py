@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+import copy_tree
+
+
+def test_copy_file(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.write_text("data\n")
+    os.utime(str(src), (1000, 1000))
+    dst.write_text("stale\n")
+
+    copy_tree.copy(str(src), str(dst))
+    assert dst.read_text() == "data\n"
+    assert os.path.samefile(str(src), str(dst))
+    assert dst.stat().st_mtime == 1000
+
+    # Already linked: left alone.
+    copy_tree.copy(str(src), str(dst))
+    assert src.stat().st_nlink == 2
+
+
+def test_copy_tree(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    (src / "sub").mkdir(parents=True)
+    (src / "a").write_text("a\n")
+    (src / "sub" / "b").write_text("b\n")
+    os.symlink("a", str(src / "link"))
+    os.utime(str(src / "sub" / "b"), (1000, 1000))
+    os.utime(str(src / "sub"), (2000, 2000))
+
+    (dst / "gone").mkdir(parents=True)
+    (dst / "stale").write_text("stale\n")
+    os.symlink("elsewhere", str(dst / "a"))
+
+    copy_tree.copy(str(src), str(dst))
+    assert sorted(os.listdir(str(dst))) == ["a", "link", "sub"]
+    assert os.path.samefile(str(src / "a"), str(dst / "a"))
+    assert not os.path.islink(str(dst / "a"))
+    assert os.readlink(str(dst / "link")) == "a"
+    assert (dst / "sub" / "b").read_text() == "b\n"
+    assert (dst / "sub" / "b").stat().st_mtime == 1000
+    assert (dst / "sub").stat().st_mtime == 2000
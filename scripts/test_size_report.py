@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+import size_report
+
+NM = """
+0000000000004010 0000000000000001 b completed.0
+0000000000002000 0000000000000004 R _IO_stdin_used
+0000000000002004 0000000000000007 R a::blob
+0000000000001050 000000000000001f T main\t/tmp/sz/m.cc:4
+0000000000001070 0000000000000022 T _start
+0000000000004040 0000000000000fa0 b big\t/tmp/sz/m.cc:3
+                 U puts@GLIBC_2.2.5
+                 w __gmon_start__
+""".strip("\n")
+
+UNITS = """
+Contents of the .debug_info section:
+
+  Compilation Unit @ offset 0:
+   Length:        0x6b (32-bit)
+   Version:       5
+ <0><c>: Abbrev Number: 3 (DW_TAG_compile_unit)
+    <d>   DW_AT_producer    : (indirect string, offset: 0): GNU C++17 12.2.0 -Os -g
+    <12>   DW_AT_name        : (indirect line string, offset: 0): gen/b.cc
+    <16>   DW_AT_comp_dir    : (indirect line string, offset: 0xd): /tmp/sz/out
+  Compilation Unit @ offset 0x6f:
+   Length:        0x10a (32-bit)
+   Version:       5
+ <0><7b>: Abbrev Number: 16 (DW_TAG_compile_unit)
+    <81>   DW_AT_name        : (indirect line string, offset: 0x1d): ../m.cc
+    <85>   DW_AT_comp_dir    : (indirect line string, offset: 0xd): /tmp/sz/out
+"""
+
+ARANGES = """
+Contents of the .debug_aranges section:
+
+  Length:                   28
+  Version:                  2
+  Offset into .debug_info:  0
+  Pointer Size:             8
+  Segment Size:             0
+
+    Address            Length
+    0000000000000000 0000000000000000
+  Length:                   44
+  Version:                  2
+  Offset into .debug_info:  0x6f
+  Pointer Size:             8
+  Segment Size:             0
+
+    Address            Length
+    0000000000001050 000000000000001f
+    0000000000000000 0000000000000000
+"""
+
+EMBED_SOURCE = """// THIS FILE WAS AUTOMATICALLY GENERATED; DO NOT EDIT
+
+namespace a {
+
+extern const char blob[] =
+    "hello\\n"
+;
+
+}  // namespace a
+"""
+
+
+def test_parse_nm():
+    symbols = list(size_report.parse_nm(NM))
+    assert [s.name for s in symbols] == [
+        "completed.0",
+        "_IO_stdin_used",
+        "a::blob",
+        "main",
+        "_start",
+        "big",
+    ]
+    assert symbols[3] == size_report.Symbol("main", "T", 0x1050, 0x1F, "/tmp/sz/m.cc")
+    assert symbols[2].path is None
+
+
+def test_units():
+    names = size_report.parse_units(UNITS)
+    assert names == {0: "/tmp/sz/out/gen/b.cc", 0x6F: "/tmp/sz/m.cc"}
+    assert list(size_report.parse_aranges(ARANGES)) == [(0x6F, 0x1050, 0x1F)]
+
+    ranges = [(0x1050, 0x106F, "/tmp/sz/m.cc"), (0x2000, 0x2010, "x.cc")]
+    unit = lambda address, path=None: size_report.unit_for(
+        size_report.Symbol("s", "T", address, 1, path), ranges
+    )
+    assert unit(0x1050) == "/tmp/sz/m.cc"
+    assert unit(0x106E) == "/tmp/sz/m.cc"
+    assert unit(0x106F) == size_report.UNKNOWN
+    assert unit(0x1000, "y.cc") == "y.cc"
+    assert unit(0x200F) == "x.cc"
+
+
+def test_read_embedded_symbol(tmp_path):
+    path = tmp_path / "b.cc"
+    path.write_text(EMBED_SOURCE)
+    assert size_report.read_embedded_symbol(str(path)) == "a::blob"
+    assert size_report.find_embedded_blobs(str(tmp_path)) == {"a::blob": str(path)}
+
+    path.write_text("int main() {}\n")
+    assert size_report.read_embedded_symbol(str(path)) is None
+
+
+def test_diff_counts():
+    old = {"main": 10, "big": 4000, "gone": 3}
+    new = {"main": 12, "big": 4000, "added": 5}
+    assert sorted(size_report.diff_counts(old, new)) == [
+        ("added", 5),
+        ("gone", -3),
+        ("main", 2),
+    ]